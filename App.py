@@ -1,7 +1,17 @@
 import streamlit as st
+import numpy as np
 from datetime import datetime
-import csv
-from io import StringIO
+import atexit
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from io import BytesIO, StringIO
+from types import SimpleNamespace
 
 # ---------------------
 # App Config
@@ -14,6 +24,7 @@ st.write(
 You have a fictional **100** dollars to allocate among our church’s ministries. 
 Assign dollar amounts to any items under **any** of the five ministry priorities.
 Your total across **all** priorities must equal **exactly 100** dollars.
+Enter amounts in the grid below, then press **Update totals** to refresh your totals.
 
 This survey is **anonymous**.
     """
@@ -54,106 +65,234 @@ PRIORITIES = [
     "Support-Centered",
 ]
 
-PRIORITY_ITEMS = {p: ALL_ITEMS for p in PRIORITIES}  # same items in each category
+# Every priority offers the same items, so ALL_ITEMS is used for each category.
+# Allocations are stored as a (priority, item) int8 array; rows follow PRIORITIES
+# and columns follow ALL_ITEMS.
+P_IDX = {p: i for i, p in enumerate(PRIORITIES)}
+
+# CSV output is formatted directly; labels are quoted once here (several items
+# contain commas). Lines end in \r\n like the csv module's default dialect.
+CSV_FIELD = {
+    s: '"' + s.replace('"', '""') + '"' if any(c in s for c in ',"\r\n') else s
+    for s in PRIORITIES + ALL_ITEMS
+}
+
+# The input grid shows one row per item and one column per priority. Its base
+# data stays all zeros; entered amounts live in the editor's edit state.
+GRID_BASE = {"Item": ALL_ITEMS, **{p: [0] * len(ALL_ITEMS) for p in PRIORITIES}}
+GRID_COLUMNS = {
+    p: st.column_config.NumberColumn(min_value=0, max_value=100, step=1, format="%d")
+    for p in PRIORITIES
+}
+
+# Queued submissions are written to disk at most this often (seconds)
+FLUSH_INTERVAL = 5.0
 
 # ---------------------
 # Helpers
 # ---------------------
 
+@st.cache_resource
+def _alloc_template():
+    """Zeroed allocations, built once per server process."""
+    return np.zeros((len(PRIORITIES), len(ALL_ITEMS)), dtype=np.int8)
+
+
 def init_state():
-    if "allocations" not in st.session_state:
-        st.session_state.allocations = {
-            p: {item: 0 for item in PRIORITY_ITEMS[p]} for p in PRIORITIES
-        }
+    if "alloc" not in st.session_state:
+        st.session_state.alloc = _alloc_template().copy()
+    if "grid_version" not in st.session_state:
+        st.session_state.grid_version = 0
     if "submitted" not in st.session_state:
         st.session_state.submitted = False
 
 
+def _grid_key():
+    return f"grid:{st.session_state.grid_version}"
+
+
 def get_subtotals_and_total():
-    subtotals = {}
-    for p in PRIORITIES:
-        subtotals[p] = sum(st.session_state.allocations[p].values())
-    total = sum(subtotals.values())
-    return subtotals, total
+    # Most reruns leave the allocations untouched; reuse the last result then
+    h = st.session_state.alloc.tobytes()
+    if st.session_state.get("_sub_h") == h:
+        return st.session_state["_sub_v"]
+    sub = st.session_state.alloc.sum(axis=1)
+    result = dict(zip(PRIORITIES, sub.tolist())), int(sub.sum())
+    st.session_state["_sub_h"], st.session_state["_sub_v"] = h, result
+    return result
+
+
+def _commit_allocations():
+    """Form submit callback: apply the grid's edited cells to the array."""
+    arr = st.session_state.alloc
+    arr[:] = 0
+    edits = st.session_state[_grid_key()]["edited_rows"]
+    for ii, changes in edits.items():
+        for p, amt in changes.items():
+            arr[P_IDX[p], int(ii)] = amt or 0
 
 
 def clear_all():
-    for p in PRIORITIES:
-        for item in PRIORITY_ITEMS[p]:
-            st.session_state.allocations[p][item] = 0
+    st.session_state.alloc[:] = 0
+    # A fresh key gives the grid a clean edit state
+    st.session_state.grid_version += 1
     st.session_state.submitted = False
 
 
+def _from_bytes(arr_bytes: bytes):
+    return np.frombuffer(arr_bytes, dtype=np.int8).reshape(len(PRIORITIES), len(ALL_ITEMS))
+
+
+@st.cache_data(max_entries=256)
+def _alloc_triples(arr_bytes: bytes):
+    """(priority, item, amount) for every nonzero cell."""
+    arr = _from_bytes(arr_bytes)
+    return [
+        (PRIORITIES[pi], ALL_ITEMS[ii], int(arr[pi, ii]))
+        for pi, ii in np.argwhere(arr > 0)
+    ]
+
+
 def allocations_rows(timestamp_iso: str):
     """Flatten allocations into CSV-ready rows."""
-    rows = []
-    for p in PRIORITIES:
-        for item, amt in st.session_state.allocations[p].items():
-            if amt and amt > 0:
-                rows.append([
-                    timestamp_iso,
-                    p,
-                    item,
-                    int(amt),
-                ])
-    return rows
+    triples = _alloc_triples(st.session_state.alloc.tobytes())
+    return [[timestamp_iso, p, item, amt] for p, item, amt in triples]
 
 
-def write_csv(rows):
-    """Append to a local CSV file (persists for the app instance) and also
-    save a per-response CSV under ./submissions/ for owner download.
+def _append_master(pending):
+    """Append pending submissions (each a list of rows) to a local CSV file
+    (persists for the app instance).
+    """
+    # Append to master, writing the header only when the file is new
+    with open("responses.csv", "a", newline="", buffering=65536) as f:
+        if f.tell() == 0:
+            f.write("timestamp,priority,item,amount\r\n")
+        f.write("".join(
+            f"{ts},{CSV_FIELD[p]},{CSV_FIELD[item]},{amt}\r\n"
+            for ts, p, item, amt in itertools.chain.from_iterable(pending)
+        ))
+    pending.clear()
+
+
+def _append_daily(pending):
+    """Append each pending response to its day's JSONL file under ./submissions/
+    (UTC date of the timestamp, one line per response) for owner download.
     """
-    import os
     os.makedirs("submissions", exist_ok=True)
+    while pending:
+        day = pending[0][0][0][:10]
+        n = next((i for i, rows in enumerate(pending) if rows[0][0][:10] != day), len(pending))
+        with open(os.path.join("submissions", f"{day}.jsonl"), "a", buffering=65536) as f:
+            f.write("".join(json.dumps({"ts": rows[0][0], "rows": rows}) + "\n" for rows in pending[:n]))
+        # Drop a day only once it is written, so a retry never repeats it
+        del pending[:n]
+
+
+def _flush_submissions(w):
+    """Write everything queued so far in one go.
+
+    Submissions stay pending for each destination until they are written
+    there, so a failed write is retried on the next flush instead of lost.
+    """
+    with w.lock:
+        while True:
+            try:
+                rows = w.q.get_nowait()
+            except queue.Empty:
+                break
+            w.master_pending.append(rows)
+            w.daily_pending.append(rows)
+        errors = []
+        for pending, write in ((w.master_pending, _append_master), (w.daily_pending, _append_daily)):
+            if pending:
+                try:
+                    write(pending)
+                except Exception as e:
+                    traceback.print_exc()
+                    errors.append(str(e))
+        w.error = "; ".join(errors) or None
+
+
+def _writer_loop(w):
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        _flush_submissions(w)
+
+
+@st.cache_resource
+def _submission_writer():
+    """Submission queue and writer state, flushed by a background thread every
+    FLUSH_INTERVAL seconds (one per server process) and once more at exit.
+    """
+    w = SimpleNamespace(
+        q=queue.Queue(),
+        lock=threading.Lock(),
+        master_pending=[],
+        daily_pending=[],
+        error=None,  # message from the last failed flush, if any
+    )
+    threading.Thread(target=_writer_loop, args=(w,), daemon=True).start()
+    atexit.register(_flush_submissions, w)
+    return w
+
+
+def write_csv(rows):
+    """Hand rows to the background writer so the script never waits on disk.
 
-    header = ["timestamp", "priority", "item", "amount"]
-    try:
-        # Create master CSV if missing
-        try:
-            with open("responses.csv", "x", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(header)
-        except FileExistsError:
-            pass
-
-        # Append to master
-        with open("responses.csv", "a", newline="") as f:
-            writer = csv.writer(f)
-            for r in rows:
-                writer.writerow(r)
-
-        # Also write a per-response CSV
-        ts_safe = rows[0][0].replace(":", "-")
-        per_path = os.path.join("submissions", f"submission_{ts_safe}.csv")
-        with open(per_path, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(header)
-            writer.writerows(rows)
-
-        return True, None
-    except Exception as e:
-        return False, str(e)
+    While the last flush is failing, new responses are refused (and the
+    respondent told) rather than queued behind a broken writer.
+    """
+    w = _submission_writer()
+    if w.error:
+        return False, w.error
+    w.q.put(rows)
+    return True, None
+
+
+@st.cache_data(max_entries=256)
+def _personal_csv(arr_bytes: bytes):
+    return "priority,item,amount\r\n" + "".join(
+        f"{CSV_FIELD[p]},{CSV_FIELD[item]},{amt}\r\n"
+        for p, item, amt in _alloc_triples(arr_bytes)
+    )
 
 
 def make_personal_copy_csv():
     """Allow the current respondent to download their own allocations as a CSV."""
-    header = ["priority", "item", "amount"]
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(header)
-    for p in PRIORITIES:
-        for item, amt in st.session_state.allocations[p].items():
-            if amt and amt > 0:
-                writer.writerow([p, item, int(amt)])
-    output.seek(0)
-    return output.getvalue()
+    return _personal_csv(st.session_state.alloc.tobytes())
+
+
+@st.cache_resource
+def _admin_libs():
+    """Import the admin-only libraries once per server process."""
+    import pandas
+    import zipfile
+    from pathlib import Path
+    # Copy-on-write is the default from pandas 3, where the option is deprecated
+    if int(pandas.__version__.split(".")[0]) < 3:
+        pandas.options.mode.copy_on_write = True
+    return SimpleNamespace(pd=pandas, zipfile=zipfile, Path=Path)
+
+
+def _submission_files():
+    """Daily submission files plus any older per-response CSVs."""
+    subs_dir = _admin_libs().Path("submissions")
+    return sorted(subs_dir.glob("*.jsonl")) + sorted(subs_dir.glob("submission_*.csv"))
+
+
+def _submissions_zip():
+    """Zip the submission files as they are when the download is requested."""
+    zipfile = _admin_libs().zipfile
+    zip_buffer = BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for fp in _submission_files():
+            zf.write(fp, arcname=fp.name)
+    return zip_buffer.getvalue()
 
 
 # ---------------------
 # Admin / Owner tools (set an optional admin key in secrets to reveal controls)
 # ---------------------
-import os
-
 # Prefer st.secrets; fall back to env var if running locally without secrets
 admin_key_secret = None
 try:
@@ -183,39 +322,31 @@ with st.sidebar:
 # ---------------------
 init_state()
 
+# Start fresh after a recorded submission
+if st.session_state.submitted:
+    clear_all()
+
 st.markdown("---")
 
-# Draw inputs in two columns per priority for readability
-for p in PRIORITIES:
-    with st.expander(f"{p}", expanded=False):
-        cols = st.columns(2)
-        items = PRIORITY_ITEMS[p]
-        half = (len(items) + 1) // 2
-        left_items = items[:half]
-        right_items = items[half:]
-
-        with cols[0]:
-            for item in left_items:
-                key = f"{p}:{item}"
-                st.session_state.allocations[p][item] = st.number_input(
-                    f"{item}",
-                    min_value=0,
-                    max_value=100,
-                    step=1,
-                    key=key,
-                    format="%d",
-                )
-        with cols[1]:
-            for item in right_items:
-                key = f"{p}:{item}"
-                st.session_state.allocations[p][item] = st.number_input(
-                    f"{item}",
-                    min_value=0,
-                    max_value=100,
-                    step=1,
-                    key=key,
-                    format="%d",
-                )
+# One editable grid for all priorities. It sits inside a form so edits are
+# batched into a single rerun; both buttons commit the grid before the script
+# runs, so a submission always records what the grid shows.
+with st.form("alloc_form", clear_on_submit=False):
+    st.data_editor(
+        GRID_BASE,
+        column_config=GRID_COLUMNS,
+        disabled=["Item"],
+        hide_index=True,
+        width="stretch",
+        key=_grid_key(),
+    )
+    update_col, submit_col, _ = st.columns([1, 1, 2])
+    with update_col:
+        st.form_submit_button("Update totals", on_click=_commit_allocations)
+    with submit_col:
+        submitted = st.form_submit_button(
+            "Submit allocations", type="primary", on_click=_commit_allocations
+        )
 
 # Totals and validation
 subtotals, total = get_subtotals_and_total()
@@ -239,17 +370,11 @@ elif total < 100:
 else:
     st.success("Perfect — total is exactly $100. You can submit now.")
 
-left, mid, right = st.columns([1,1,2])
+st.button("Clear all", on_click=clear_all)
 
-with left:
-    if st.button("Clear all"):
-        clear_all()
-        st.rerun()
-
-with mid:
-    submitted = st.button("Submit allocations", type="primary", disabled=(total != 100))
-
-if submitted and total == 100:
+if submitted and total != 100:
+    st.error("Your total must be exactly $100 to submit.")
+elif submitted:
     timestamp = datetime.utcnow().isoformat()
     rows = allocations_rows(timestamp)
     if not rows:
@@ -268,7 +393,6 @@ if submitted and total == 100:
                 file_name="my_ministry_allocation.csv",
                 mime="text/csv",
             )
-            clear_all()
         else:
             st.error(f"There was an error saving your response: {err}")
 
@@ -325,45 +449,47 @@ if 'owner_mode' in globals() and owner_mode:
     st.markdown("---")
     st.subheader("Admin: All Submissions")
 
-    import os, zipfile
-    from pathlib import Path
-
-    # Preview master CSV
-    if Path("responses.csv").exists():
-        try:
-            import pandas as pd
-            df = pd.read_csv("responses.csv")
-            st.caption(f"Total rows: {len(df)} (each row = one line item)")
-            st.dataframe(df, use_container_width=True, hide_index=True)
-
-            # Download master CSV
-            with open("responses.csv", "rb") as f:
-                st.download_button(
-                    "Download ALL responses (master CSV)",
-                    data=f.read(),
-                    file_name="all_responses.csv",
-                    mime="text/csv",
+    libs = _admin_libs()
+
+    # Download master CSV; the file is read only when the download is requested
+    if libs.Path("responses.csv").exists():
+        st.download_button(
+            "Download ALL responses (master CSV)",
+            data=libs.Path("responses.csv").read_bytes,
+            file_name="all_responses.csv",
+            mime="text/csv",
+        )
+
+        # Preview only the tail, and only on request
+        if st.checkbox("Preview last 500 rows"):
+            try:
+                with open("responses.csv", newline="") as f:
+                    header = f.readline()
+                    tail = deque(enumerate(f, 1), maxlen=500)
+                n_rows = tail[-1][0] if tail else 0
+                df = libs.pd.read_csv(
+                    StringIO(header + "".join(line for _, line in tail)),
+                    dtype={"amount": "int8", "priority": "category", "item": "category"},
+                    parse_dates=["timestamp"],
+                    engine="c",
                 )
-        except Exception as e:
-            st.warning(f"Couldn't preview master CSV: {e}")
+                st.caption(f"Total rows: {n_rows} (each row = one line item)")
+                st.dataframe(df, use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.warning(f"Couldn't preview master CSV: {e}")
     else:
         st.info("No responses saved yet.")
 
-    # Zip up per-response CSVs for download
-    subs_dir = Path("submissions")
+    # Zip up the daily submission files (plus any older per-response CSVs)
+    subs_dir = libs.Path("submissions")
     if subs_dir.exists():
-        files = list(subs_dir.glob("submission_*.csv"))
-        st.caption(f"Individual submission files: {len(files)}")
+        files = _submission_files()
+        st.caption(f"Submission files: {len(files)}")
         if files:
-            import io
-            zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-                for fp in files:
-                    zf.write(fp, arcname=fp.name)
-            zip_buffer.seek(0)
+            # Built on click, not on every admin rerun, and never stale
             st.download_button(
                 "Download ZIP of all individual submissions",
-                data=zip_buffer,
+                data=_submissions_zip,
                 file_name="all_submissions.zip",
                 mime="application/zip",
             )